@@ -1 +1,2 @@
+from .recorder import EventRecorder, read_events
 from .socketapi import SocketAPI
@@ -12,3 +12,7 @@ class InvalidURIError(InvalidRequestError):
 
 class NotFoundError(InvalidRequestError):
     pass
+
+
+class EventLogError(SocketAPIError):
+    pass
@@ -0,0 +1,181 @@
+import atexit
+import json
+import os
+import struct
+import threading
+
+from collections import namedtuple
+
+from .exc import EventLogError
+
+
+# Every event log starts with this header, so that we can refuse to read
+# files that weren't produced by an EventRecorder.
+MAGIC = b'SAPI\x01'
+
+# Each record is made of a fixed-size part (timestamp, handler time, payload
+# size and event code) followed by the length-prefixed sid, uri and payload.
+RECORD = struct.Struct('<ddIB')
+SHORT_LENGTH = struct.Struct('<H')
+LONG_LENGTH = struct.Struct('<I')
+
+# Longer sids and uris are truncated so that their length fits the record.
+MAX_STRING_LENGTH = 0xffff
+
+EVENTS = ('create', 'patch', 'delete', 'subscribe', 'unsubscribe')
+EVENT_CODES = dict((event, code) for code, event in enumerate(EVENTS))
+
+
+RecordedEvent = namedtuple('RecordedEvent', [
+    'timestamp', 'sid', 'event', 'uri', 'payload_size', 'handler_time', 'payload'
+])
+
+
+def encode_payload(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def encode_string(value):
+    encoded = ('%s' % value if value is not None else '').encode('utf-8')
+    if len(encoded) > MAX_STRING_LENGTH:
+        # Drop the bytes of the last character if it got cut in half.
+        encoded = encoded[:MAX_STRING_LENGTH].decode('utf-8', 'ignore').encode('utf-8')
+    return encoded
+
+
+class EventRecorder(object):
+
+    def __init__(self, log, store_payloads=False):
+        # The log may either be a path or a binary file-like object.
+        if hasattr(log, 'write'):
+            self.stream = log
+            self.owns_stream = False
+
+            # Streams we can't seek into (e.g. pipes or sockets) are
+            # considered new logs.
+            is_new = True
+            if getattr(log, 'seekable', lambda: False)():
+                log.seek(0, 2)
+                is_new = log.tell() == 0
+                if not is_new and getattr(log, 'readable', lambda: False)():
+                    log.seek(0)
+                    check_header(log)
+                    log.seek(0, 2)
+        else:
+            is_new = not os.path.exists(log) or os.path.getsize(log) == 0
+            if not is_new:
+                # Refuse to append records to a file that isn't a log.
+                with open(log, 'rb') as stream:
+                    check_header(stream)
+
+            self.stream = open(log, 'ab')
+            self.owns_stream = True
+
+            # Make sure the log gets closed if the application exits without
+            # closing the recorder.
+            atexit.register(self.close)
+
+        # Write the header if we're starting a new log.
+        if is_new:
+            self.stream.write(MAGIC)
+
+        self.store_payloads = store_payloads
+        self.lock = threading.Lock()
+
+    def record(self, timestamp, sid, event, uri, payload, handler_time):
+        # The size of the received message isn't available to the handlers,
+        # so the recorded size is that of the payload re-encoded as compact
+        # JSON.
+        encoded = encode_payload(payload)
+        sid = encode_string(sid)
+        uri = encode_string(uri)
+        stored = encoded if self.store_payloads else b''
+
+        record = b''.join([
+            RECORD.pack(timestamp, handler_time, len(encoded), EVENT_CODES[event]),
+            SHORT_LENGTH.pack(len(sid)), sid,
+            SHORT_LENGTH.pack(len(uri)), uri,
+            LONG_LENGTH.pack(len(stored)), stored
+        ])
+
+        # Handlers may run concurrently, so make sure records don't get
+        # interleaved in the log.
+        with self.lock:
+            # Events handled after the recorder was closed are ignored.
+            if self.stream is None:
+                return
+            self.stream.write(record)
+
+            # Flush every record, so that they survive a crash of the
+            # application.
+            self.stream.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.flush()
+
+    def close(self):
+        with self.lock:
+            if self.stream is None:
+                return
+            if self.owns_stream:
+                self.stream.close()
+
+                # Let the closed recorder be garbage collected (Python 2
+                # can't unregister exit handlers).
+                if hasattr(atexit, 'unregister'):
+                    atexit.unregister(self.close)
+            else:
+                self.stream.flush()
+            self.stream = None
+
+
+def check_header(stream):
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise EventLogError('not an event log')
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EventLogError('truncated event log')
+    return data
+
+
+def read_events(log):
+    # The log may either be a path or a binary file-like object.
+    if hasattr(log, 'read'):
+        stream = log
+    else:
+        stream = open(log, 'rb')
+
+    try:
+        check_header(stream)
+
+        while True:
+            head = stream.read(RECORD.size)
+            if not head:
+                break
+            if len(head) != RECORD.size:
+                raise EventLogError('truncated event log')
+            timestamp, handler_time, payload_size, code = RECORD.unpack(head)
+
+            length, = SHORT_LENGTH.unpack(read_exactly(stream, SHORT_LENGTH.size))
+            sid = read_exactly(stream, length).decode('utf-8')
+            length, = SHORT_LENGTH.unpack(read_exactly(stream, SHORT_LENGTH.size))
+            uri = read_exactly(stream, length).decode('utf-8')
+            length, = LONG_LENGTH.unpack(read_exactly(stream, LONG_LENGTH.size))
+            payload = read_exactly(stream, length)
+            payload = json.loads(payload.decode('utf-8')) if payload else None
+
+            try:
+                event = EVENTS[code]
+            except IndexError:
+                raise EventLogError('unknown event code %i' % code)
+
+            yield RecordedEvent(
+                timestamp, sid, event, uri, payload_size, handler_time, payload)
+    finally:
+        if stream is not log:
+            stream.close()
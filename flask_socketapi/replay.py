@@ -0,0 +1,187 @@
+"""
+Replay an event log recorded by an EventRecorder against a local application.
+
+Usage:
+
+    python -m flask_socketapi.replay events.log myapp:app [--speed 10]
+"""
+
+import argparse
+import importlib
+import sys
+import time
+import warnings
+
+from .exc import EventLogError
+from .recorder import read_events
+
+
+# Use the most precise clock available to measure latencies.
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def make_payload(event):
+    # Use the recorded payload if the log contains it, otherwise fall back to
+    # the smallest payload that still reaches the same handler.
+    if event.payload is not None:
+        return event.payload
+    if event.event in ('subscribe', 'unsubscribe'):
+        return event.uri
+    return {'uri': event.uri}
+
+
+def replay(app, socketio, events, speed=1.0, namespace=None):
+    # Each recorded session is replayed by its own test client, so that
+    # subscriptions end up in the same rooms as they did originally.
+    clients = {}
+    latencies = {}
+    errors = {}
+    warned = False
+
+    origin = None
+    started = timer()
+    for event in events:
+        # Wait until the event is due, unless we replay as fast as possible.
+        if origin is None:
+            origin = event.timestamp
+        if speed > 0:
+            delay = (event.timestamp - origin) / speed - (timer() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        if event.sid not in clients:
+            clients[event.sid] = socketio.test_client(app, namespace=namespace)
+        client = clients[event.sid]
+
+        # Creations and patches can't be reproduced faithfully without their
+        # recorded payload.
+        if (event.payload is None) and (event.event in ('create', 'patch')) and not warned:
+            warnings.warn(
+                'the event log does not contain payloads, creations and patches '
+                'are replayed without attributes (record with store_payloads=True)')
+            warned = True
+
+        start = timer()
+        client.emit(event.event, make_payload(event), namespace=namespace)
+        latencies.setdefault(event.event, []).append(timer() - start)
+
+        # Count the events that failed, judging from what was sent back to
+        # the emitting client.
+        received = client.get_received(namespace)
+        if any(message['name'] in ('api_error', 'server_error') for message in received):
+            errors[event.event] = errors.get(event.event, 0) + 1
+
+        # Discard the messages broadcast to the other clients, so that they
+        # don't accumulate during long replays.
+        for other in clients.values():
+            if other is not client:
+                other.get_received(namespace)
+
+    elapsed = timer() - started
+
+    for client in clients.values():
+        client.disconnect(namespace)
+
+    return elapsed, latencies, errors
+
+
+def percentile(values, p):
+    index = int(round(p / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def report(elapsed, latencies, errors=None, out=None):
+    errors = errors or {}
+    out = out or sys.stdout
+
+    count = sum(len(values) for values in latencies.values())
+    out.write('%i events in %.3fs (%.1f events/s), %i errors\n' % (
+        count, elapsed, count / elapsed if elapsed > 0 else 0.0, sum(errors.values())))
+
+    out.write('%-12s %8s %8s %10s %10s %10s %10s %10s\n' % (
+        'event', 'count', 'errors',
+        'mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'max (ms)'))
+
+    rows = sorted(latencies.items())
+    rows.append(('all', [value for _, values in rows for value in values]))
+    for name, values in rows:
+        if not values:
+            continue
+        values = sorted(values)
+        out.write('%-12s %8i %8i %10.3f %10.3f %10.3f %10.3f %10.3f\n' % (
+            name, len(values),
+            sum(errors.values()) if name == 'all' else errors.get(name, 0),
+            sum(values) / len(values) * 1000,
+            percentile(values, 50) * 1000,
+            percentile(values, 95) * 1000,
+            percentile(values, 99) * 1000,
+            values[-1] * 1000))
+
+
+def read_valid_events(events, failures):
+    # Stop at the first invalid record, so that the events preceding a
+    # truncated tail still get replayed.
+    try:
+        for event in events:
+            yield event
+    except EventLogError as e:
+        failures.append(e)
+
+
+def load_attribute(path):
+    module_name, _, attribute = path.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or 'app')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay a Flask-SocketAPI event log against a local application.')
+    parser.add_argument('log', help='path to the event log')
+    parser.add_argument('app', help='Flask application to drive, as module:attribute')
+    parser.add_argument(
+        '--socketio', default=None,
+        help='SocketIO object of the application, as module:attribute '
+             '(defaults to the "socketio" attribute of the application module)')
+    parser.add_argument('--namespace', default=None, help='SocketIO namespace of the API')
+    parser.add_argument(
+        '--speed', type=float, default=1.0,
+        help='replay speed factor, or 0 to replay as fast as possible (default: 1)')
+    args = parser.parse_args(argv)
+
+    if args.speed < 0:
+        parser.error('the replay speed cannot be negative')
+
+    # Make sure the application module can be imported from the current
+    # directory, as it would be with `python -m`.
+    if '' not in sys.path:
+        sys.path.insert(0, '')
+
+    try:
+        app = load_attribute(args.app)
+        socketio = load_attribute(
+            args.socketio or '%s:socketio' % args.app.partition(':')[0])
+    except (ImportError, AttributeError) as e:
+        parser.error('cannot load the application: %s' % e)
+
+    try:
+        log = open(args.log, 'rb')
+    except IOError as e:
+        parser.error('cannot open the event log: %s' % e)
+
+    failures = []
+    with log:
+        events = read_valid_events(read_events(log), failures)
+        elapsed, latencies, errors = replay(
+            app, socketio, events, speed=args.speed, namespace=args.namespace)
+
+    if failures and not latencies:
+        parser.error('cannot read the event log: %s' % failures[0])
+
+    report(elapsed, latencies, errors)
+    if failures:
+        sys.exit('error: the event log is invalid after the replayed events: %s' % failures[0])
+
+
+if __name__ == '__main__':
+    main()
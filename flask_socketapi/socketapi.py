@@ -1,3 +1,5 @@
+import time
+
 from functools import wraps
 
 from werkzeug.exceptions import HTTPException
@@ -9,11 +11,18 @@ from flask_socketio import join_room, leave_room
 from .exc import InvalidRequestError, InvalidURIError, SocketAPIError
 
 
+# Use the most precise clock available to measure handler times.
+timer = getattr(time, 'perf_counter', time.time)
+
+
 class SocketAPI(object):
 
-    def __init__(self, socketio=None, namespace=None):
+    def __init__(self, socketio=None, namespace=None, recorder=None):
         self.namespace = namespace
 
+        # An optional EventRecorder that logs the events handled by the API.
+        self.recorder = recorder
+
         self.routes = Map()
         self.urls = self.routes.bind('/', '/')
 
@@ -26,6 +35,7 @@ class SocketAPI(object):
         self.socketio = socketio
 
         @socketio.on('create', namespace=self.namespace)
+        @self.recorded('create')
         def handle_create(payload):
             # Retreive request arguments.
             if 'uri' not in payload:
@@ -51,6 +61,7 @@ class SocketAPI(object):
             }, room=uri)
 
         @socketio.on('patch')
+        @self.recorded('patch')
         def handle_patch(payload, namespace=self.namespace):
             # Retreive request arguments.
             if 'uri' not in payload:
@@ -79,6 +90,7 @@ class SocketAPI(object):
                 }, room=room_name)
 
         @socketio.on('delete', namespace=self.namespace)
+        @self.recorded('delete')
         def handle_delete(payload):
             # Retreive request arguments.
             if 'uri' not in payload:
@@ -103,6 +115,7 @@ class SocketAPI(object):
                 }, room=room_name)
 
         @socketio.on('subscribe', namespace=self.namespace)
+        @self.recorded('subscribe')
         def handle_subscribe(uri):
             # Try to retrieve the subscribed resource, so that we can send its
             # current state to the subscriber.
@@ -121,6 +134,7 @@ class SocketAPI(object):
             join_room(uri)
 
         @socketio.on('unsubscribe', namespace=self.namespace)
+        @self.recorded('unsubscribe')
         def handle_unsubscribe(uri):
             leave_room(uri)
 
@@ -143,6 +157,35 @@ class SocketAPI(object):
             # Log the error.
             current_app.logger.exception(e)
 
+    def recorded(self, event):
+        def decorate(fn):
+            @wraps(fn)
+            def decorated(payload):
+                # Don't bother measuring anything if there's no recorder.
+                if self.recorder is None:
+                    return fn(payload)
+
+                timestamp = time.time()
+                start = timer()
+                try:
+                    return fn(payload)
+                finally:
+                    # Record the event even if the handler failed, so that
+                    # erroneous requests also get replayed.
+                    self.record_event(event, payload, timestamp, timer() - start)
+
+            return decorated
+        return decorate
+
+    def record_event(self, event, payload, timestamp, handler_time):
+        # The recorder is only a diagnostic tool, so its failures are logged
+        # rather than propagated to the client.
+        try:
+            uri = payload.get('uri') if isinstance(payload, dict) else payload
+            self.recorder.record(timestamp, request.sid, event, uri, payload, handler_time)
+        except Exception as e:
+            current_app.logger.exception(e)
+
     def resource_creator(self, rule):
         # Make sure the given rule corresponds to a list uri.
         if not rule.endswith('/'):
@@ -27,6 +27,11 @@ setup(
         'coverage'
     ],
     test_suite='test_socketapi',
+    entry_points={
+        'console_scripts': [
+            'flask-socketapi-replay = flask_socketapi.replay:main'
+        ]
+    },
     classifiers=[
         'Environment :: Web Environment',
         'Intended Audience :: Developers',
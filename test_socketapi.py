@@ -4,10 +4,28 @@ import coverage
 cov = coverage.coverage()
 cov.start()
 
+import atexit
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+import weakref
+
+from io import BytesIO
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 from flask import Flask
 from flask_socketio import SocketIO, rooms
-from flask_socketapi import SocketAPI
-from flask_socketapi.exc import InvalidURIError
+from flask_socketapi import EventRecorder, SocketAPI, read_events
+from flask_socketapi.recorder import MAGIC, RECORD
+from flask_socketapi.replay import main, replay, report
+from flask_socketapi.exc import EventLogError, InvalidURIError
 
 
 app = Flask(__name__)
@@ -65,7 +83,7 @@ class TestSocketAPI(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cov.stop()
-        cov.report(include='flask_socketapi/socketapi.py')
+        cov.report(include='flask_socketapi/*.py')
 
     def test_subscription(self):
         client = socketio.test_client(app)
@@ -310,6 +328,337 @@ class TestSocketAPI(unittest.TestCase):
         except Exception as e:
             self.assertIsInstance(e, InvalidURIError)
 
+    def test_record_events(self):
+        global apples
+        apples[0] = {'foo': 0, 'bar': 'koala'}
+
+        log = BytesIO()
+        socketapi.recorder = EventRecorder(log)
+        self.addCleanup(setattr, socketapi, 'recorder', None)
+
+        client = socketio.test_client(app)
+        client.emit('subscribe', '/apples/0')
+        client.emit('patch', {
+            'uri': '/apples/0',
+            'patch': {'foo': 2}
+        })
+        client.emit('delete', {
+            'uri': '/oranges/0'
+        })
+
+        socketapi.recorder = None
+        events = list(read_events(BytesIO(log.getvalue())))
+
+        self.assertEqual([e.event for e in events], ['subscribe', 'patch', 'delete'])
+        self.assertEqual([e.uri for e in events], ['/apples/0', '/apples/0', '/oranges/0'])
+        self.assertEqual(set(e.sid for e in events), {client.sid})
+        self.assertEqual(events[1].payload_size, len('{"uri":"/apples/0","patch":{"foo":2}}'))
+        self.assertIsNone(events[1].payload)
+        for event in events:
+            self.assertGreaterEqual(event.handler_time, 0)
+
+        apples.clear()
+
+    def test_replay_events(self):
+        global apples
+
+        log = BytesIO()
+        socketapi.recorder = EventRecorder(log, store_payloads=True)
+        self.addCleanup(setattr, socketapi, 'recorder', None)
+
+        client = socketio.test_client(app)
+        client.emit('create', {
+            'uri': '/apples/',
+            'attributes': {'foo': 0, 'bar': 'koala'}
+        })
+        client.emit('delete', {
+            'uri': '/apples/0'
+        })
+
+        socketapi.recorder = None
+        events = list(read_events(BytesIO(log.getvalue())))
+        self.assertEqual(events[0].payload['attributes'], {'foo': 0, 'bar': 'koala'})
+
+        elapsed, latencies, errors = replay(app, socketio, events, speed=0)
+
+        self.assertEqual(len(apples), 0)
+        self.assertEqual(len(latencies['create']), 1)
+        self.assertEqual(len(latencies['delete']), 1)
+        self.assertEqual(errors, {})
+
+        out = StringIO()
+        report(elapsed, latencies, errors, out=out)
+        self.assertIn('2 events', out.getvalue())
+        self.assertIn('0 errors', out.getvalue())
+
+        apples.clear()
+
+    def test_replay_errors(self):
+        global apples
+
+        log = BytesIO()
+        recorder = EventRecorder(log)
+        recorder.record(0.0, 'sid', 'create', '/apples/', {'uri': '/apples/'}, 0.0)
+        recorder.record(0.0, 'sid', 'delete', '/oranges/0', {'uri': '/oranges/0'}, 0.0)
+        events = list(read_events(BytesIO(log.getvalue())))
+
+        # The creation can't be replayed without its attributes.
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            elapsed, latencies, errors = replay(app, socketio, events, speed=0)
+
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(errors, {'create': 1, 'delete': 1})
+
+        apples.clear()
+
+    def test_recorder_failure(self):
+        global apples
+
+        class BrokenRecorder(object):
+            def record(self, *args):
+                raise ValueError('broken recorder')
+
+        socketapi.recorder = BrokenRecorder()
+        self.addCleanup(setattr, socketapi, 'recorder', None)
+
+        client = socketio.test_client(app)
+        client.emit('create', {
+            'uri': '/apples/',
+            'attributes': {'foo': 0, 'bar': 'koala'}
+        })
+        client.emit('delete', {
+            'uri': '/oranges/0'
+        })
+        received = client.get_received()
+
+        self.assertIn({'foo': 0, 'bar': 'koala'}, apples.values())
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]['name'], 'api_error')
+        self.assertEqual(received[0]['args'][0]['error'], 'InvalidRequestError')
+
+        apples.clear()
+
+    def test_closed_recorder(self):
+        log = BytesIO()
+        recorder = EventRecorder(log)
+        recorder.close()
+
+        socketapi.recorder = recorder
+        self.addCleanup(setattr, socketapi, 'recorder', None)
+
+        client = socketio.test_client(app)
+        client.emit('subscribe', '/oranges/0')
+
+        self.assertEqual(client.get_received(), [])
+        self.assertIn('/oranges/0', socketio.server.rooms(client.sid))
+        self.assertEqual(log.getvalue(), MAGIC)
+
+    def test_record_long_uri(self):
+        log = BytesIO()
+        recorder = EventRecorder(log)
+        recorder.record(0.0, 'sid', 'subscribe', '/' + u'\u00e9' * 40000, None, 0.0)
+
+        events = list(read_events(BytesIO(log.getvalue())))
+
+        self.assertEqual(len(events), 1)
+        self.assertLessEqual(len(events[0].uri.encode('utf-8')), 0xffff)
+        self.assertTrue(events[0].uri.startswith(u'/\u00e9'))
+
+    def test_recorder_log_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.log')
+
+        recorder = EventRecorder(path)
+        recorder.record(0.0, 'sid', 'subscribe', '/apples/', '/apples/', 0.0)
+
+        # Records should be written without waiting for the recorder to be
+        # closed.
+        self.assertGreater(os.path.getsize(path), len(MAGIC))
+        recorder.close()
+
+        # Reopening the log should append to it, without another header.
+        recorder = EventRecorder(path)
+        recorder.record(1.0, 'sid', 'unsubscribe', '/apples/', '/apples/', 0.0)
+        recorder.close()
+
+        events = list(read_events(path))
+        self.assertEqual([e.event for e in events], ['subscribe', 'unsubscribe'])
+
+        # Closed recorders shouldn't be kept alive by their exit handler.
+        if hasattr(atexit, 'unregister'):
+            recorder = weakref.ref(recorder)
+            gc.collect()
+            self.assertIsNone(recorder())
+
+    def test_recorder_foreign_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.log')
+        with open(path, 'wb') as f:
+            f.write(b'not a log')
+
+        self.assertRaises(EventLogError, EventRecorder, path)
+        self.assertRaises(EventLogError, EventRecorder, BytesIO(b'not a log'))
+
+    def test_recorder_unseekable_stream(self):
+        class Pipe(object):
+            def __init__(self):
+                self.data = b''
+
+            def seekable(self):
+                return False
+
+            def write(self, data):
+                self.data += data
+
+            def flush(self):
+                pass
+
+        pipe = Pipe()
+        recorder = EventRecorder(pipe)
+        recorder.record(0.0, 'sid', 'subscribe', '/apples/', '/apples/', 0.0)
+
+        events = list(read_events(BytesIO(pipe.data)))
+        self.assertEqual([e.event for e in events], ['subscribe'])
+
+    def test_replay_drains_subscribers(self):
+        global apples
+        apples[0] = {'foo': 0, 'bar': 'koala'}
+
+        log = BytesIO()
+        recorder = EventRecorder(log, store_payloads=True)
+        recorder.record(0.0, 'subscriber', 'subscribe', '/apples/0', '/apples/0', 0.0)
+        for i in range(10):
+            recorder.record(0.0, 'patcher', 'patch', '/apples/0', {
+                'uri': '/apples/0',
+                'patch': {'foo': i}
+            }, 0.0)
+        events = list(read_events(BytesIO(log.getvalue())))
+
+        # Keep track of the clients created by the replay.
+        clients = []
+        test_client = socketio.test_client
+
+        def tracked_test_client(*args, **kwargs):
+            clients.append(test_client(*args, **kwargs))
+            return clients[-1]
+
+        socketio.test_client = tracked_test_client
+        self.addCleanup(delattr, socketio, 'test_client')
+
+        elapsed, latencies, errors = replay(app, socketio, events, speed=0)
+
+        self.assertEqual(len(clients), 2)
+        self.assertEqual(errors, {})
+        self.assertEqual(apples[0]['foo'], 9)
+        for client in clients:
+            # Test clients share a queue indexed by sid in older versions of
+            # Flask-SocketIO.
+            queue = client.queue
+            if isinstance(queue, dict):
+                queue = queue.get(client.sid, [])
+            self.assertEqual(len(queue), 0)
+
+        apples.clear()
+
+    def run_replay(self, argv):
+        # Capture the report printed by the replay command.
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = StringIO()
+        try:
+            main(argv)
+        finally:
+            out = sys.stdout.getvalue()
+            sys.stdout, sys.stderr = stdout, stderr
+        return out
+
+    def test_replay_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.log')
+
+        recorder = EventRecorder(path)
+        recorder.record(0.0, 'sid', 'subscribe', '/oranges/', '/oranges/', 0.0)
+        recorder.record(0.0, 'sid', 'unsubscribe', '/oranges/', '/oranges/', 0.0)
+        recorder.close()
+
+        # The SocketIO object should be looked up in the application module
+        # by default.
+        out = self.run_replay([path, '%s:app' % __name__, '--speed', '0'])
+        self.assertIn('2 events', out)
+
+        out = self.run_replay([
+            path, __name__, '--socketio', '%s:socketio' % __name__, '--speed', '0'])
+        self.assertIn('2 events', out)
+
+    def test_replay_command_errors(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.log')
+
+        # Negative speed.
+        with self.assertRaises(SystemExit) as context:
+            self.run_replay([path, '%s:app' % __name__, '--speed', '-1'])
+        self.assertEqual(context.exception.code, 2)
+
+        # Missing log.
+        with self.assertRaises(SystemExit) as context:
+            self.run_replay([path, '%s:app' % __name__])
+        self.assertEqual(context.exception.code, 2)
+
+        # Missing application.
+        with self.assertRaises(SystemExit) as context:
+            self.run_replay([path, '%s:nothing' % __name__])
+        self.assertEqual(context.exception.code, 2)
+
+        # Invalid log.
+        with open(path, 'wb') as f:
+            f.write(b'not a log')
+        with self.assertRaises(SystemExit) as context:
+            self.run_replay([path, '%s:app' % __name__])
+        self.assertEqual(context.exception.code, 2)
+
+        # Truncated log, whose valid events should still be reported.
+        log = BytesIO()
+        recorder = EventRecorder(log)
+        recorder.record(0.0, 'sid', 'subscribe', '/oranges/', '/oranges/', 0.0)
+        recorder.record(0.0, 'sid', 'unsubscribe', '/oranges/', '/oranges/', 0.0)
+        with open(path, 'wb') as f:
+            f.write(log.getvalue()[:-4])
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            with self.assertRaises(SystemExit) as context:
+                main([path, '%s:app' % __name__, '--speed', '0'])
+            out = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertIn('1 events', out)
+        self.assertIn('truncated event log', context.exception.code)
+
+    def test_read_invalid_logs(self):
+        log = BytesIO()
+        recorder = EventRecorder(log)
+        recorder.record(0.0, 'sid', 'subscribe', '/apples/', '/apples/', 0.0)
+        data = log.getvalue()
+
+        # Bad header.
+        with self.assertRaises(EventLogError):
+            list(read_events(BytesIO(b'SAPI\x02' + data[len(MAGIC):])))
+
+        # Truncated records.
+        for size in (len(MAGIC) + 3, len(MAGIC) + RECORD.size + 1, len(data) - 1):
+            with self.assertRaises(EventLogError):
+                list(read_events(BytesIO(data[:size])))
+
+        # Unknown event code.
+        record = RECORD.pack(0.0, 0.0, 0, 42) + b'\x00\x00' * 2 + b'\x00' * 4
+        with self.assertRaises(EventLogError):
+            list(read_events(BytesIO(MAGIC + record)))
+
 
 if __name__ == '__main__':
     unittest.main()